@@ -7,28 +7,57 @@
 # - NO state updates / CSV logging inside /video_feed generator
 #   (prevents duplication when multiple clients connect)
 # - A SINGLE background thread:
-#   - reads /dev/shm/adris_latest.jpg and /dev/shm/adris_latest.json
-#   - overlays bounding boxes server-side (Pillow)
+#   - reads the inference frame slot (mmap) and the shared JSON; falls
+#     back to /dev/shm/adris_latest.jpg when inference is not publishing
+#   - overlays bounding boxes server-side (libjpeg-turbo + NumPy, or Pillow)
 #   - updates cached stats/logs/performance history
 #   - appends CSV rows (detections-only)
 # - /video_feed simply streams the latest cached annotated JPEG
 # - All /api/* endpoints serve cached state
+# - start.py serves this app with gunicorn + gevent (one worker) when
+#   available; `python dashboard_server.py` runs the Flask server
 #
-# Dependencies: flask, pillow
+# Dependencies: flask, pillow (gunicorn + gevent for production serving)
+# Optional: PyTurboJPEG (SIMD JPEG decode/encode; falls back to Pillow)
+#           inotify_simple (event-driven updater; falls back to polling)
+#           orjson (faster JSON parse/serialize; falls back to json)
 
+import atexit
+import functools
 import io
 import json
+import mmap
 import os
+import signal
+import struct
+import sys
 import threading
 import time
 from collections import deque
 from datetime import datetime
 from pathlib import Path
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, List, Optional, Tuple
 
-from flask import Flask, Response, jsonify, render_template
+from flask import Flask, Response, render_template, request
 from PIL import Image, ImageDraw, ImageFont
 
+try:
+    import numpy as np
+    from turbojpeg import TJPF_RGB, TurboJPEG
+    _tj = TurboJPEG()
+except Exception:
+    _tj = None
+
+try:
+    import orjson
+except Exception:
+    orjson = None
+
+try:
+    from inotify_simple import INotify, flags as inotify_flags
+except Exception:
+    INotify = None
+
 
 # ---------------------------------------------------------------------
 # Load Configuration
@@ -49,15 +78,21 @@ FRAME_HEIGHT = int(CONFIG["runtime"]["frame_height"])
 
 SHARED_FRAME_PATH = str(CONFIG["paths"]["shared_frame"])
 SHARED_JSON_PATH = str(CONFIG["paths"]["shared_json"])
+SHARED_FRAME_SLOT_PATH = str(CONFIG["paths"]["shared_frame_slot"])
 CSV_LOG_PATH = PROJECT_ROOT / CONFIG["paths"]["csv_log"]
 
 # Background update frequency. Keep it aligned with target stream rate.
+# With inotify this is only the fallback cadence; the updater otherwise
+# wakes as soon as the producer publishes a new payload.
 UPDATER_HZ = TARGET_FPS
 UPDATER_SLEEP = 1.0 / max(1.0, UPDATER_HZ)
 
 # Stale timeout (seconds). If JSON is older than this, treat as stale.
 STALE_JSON_S = 2.0
 
+# CSV log is kept open and flushed at most this often (seconds)
+CSV_FLUSH_S = 1.0
+
 # Buffer sizes
 RECENT_LOGS_MAX = 200
 PERF_MAX = 180
@@ -71,14 +106,14 @@ app = Flask(__name__, template_folder="templates", static_folder="static")
 
 
 # ---------------------------------------------------------------------
-# Cached State (shared between background thread + request handlers)
+# Cached State
+#
+# Only the background thread mutates the buffers/counters below. After
+# each tick it builds a fresh snapshot dict and rebinds _latest_state;
+# request handlers take that reference once, without locking (name
+# rebinding is atomic under the GIL). Snapshots are never mutated.
 # ---------------------------------------------------------------------
 
-state_lock = threading.Lock()
-
-cached_annotated_jpeg: bytes = b""
-cached_last_frame_ok: bool = False
-
 recent_logs = deque(maxlen=RECENT_LOGS_MAX)           # list of dicts for /api/logs
 performance_history = deque(maxlen=PERF_MAX)          # list of {cpu, memory} for chart
 latency_window = deque(maxlen=LAT_WINDOW_MAX)         # numeric latency values
@@ -86,7 +121,41 @@ latency_window = deque(maxlen=LAT_WINDOW_MAX)         # numeric latency values
 total_detections: int = 0
 last_fps: float = 0.0
 
-last_payload_timestamp_processed: Optional[str] = None  # ensures we don't double-log
+last_payload_processed: Optional[Any] = None  # seq (or timestamp); ensures we don't double-log
+dropped_payloads: int = 0  # producer seqs overwritten before the updater read them
+
+_csv_file: Optional[Any] = None
+_csv_last_flush: float = 0.0
+
+_json_signature: Optional[Tuple[int, int, int]] = None  # (inode, mtime_ns, size)
+_json_payload: Optional[Dict[str, Any]] = None
+
+stats_version: int = 0  # bumped per stats snapshot; stamps each rebuilt view's ETag
+_etag_prefix = f"{int(time.time())}-"  # keeps ETags unique across restarts
+
+
+def _dumps(obj: Any) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj).encode("utf-8")
+
+
+# API views are stored pre-serialized: handlers do O(1) work per request
+_latest_state: Dict[str, Any] = {
+    "jpeg": b"",
+    "mjpeg": b"",          # jpeg wrapped in its multipart frame, shared by all clients
+    "frame_ok": False,
+    # <view>_version: stats_version when that view's bytes were last built
+    "stats_version": stats_version,
+    "detection_stats_version": stats_version,
+    "logs_version": stats_version,
+    "perf_version": stats_version,
+    "stats": _dumps({"fps": 0.0, "avg_inference_time": 0.0, "detections_count": 0,
+                     "dropped_payloads": 0}),
+    "detection_stats": _dumps({"class_counts": {"person": 0}}),
+    "logs": _dumps({"logs": []}),
+    "perf": _dumps([]),
+}
 
 # ---------------------------------------------------------------------
 # Utilities
@@ -102,14 +171,116 @@ def _ensure_csv_header() -> None:
         CSV_LOG_PATH.write_text(header, encoding="utf-8")
 
 
+def _csv_write(lines: List[str]) -> None:
+    """
+    Append rows to the long-lived CSV handle (opened lazily, buffered).
+    """
+    global _csv_file
+    if _csv_file is None:
+        try:
+            _csv_file = open(CSV_LOG_PATH, "a", encoding="utf-8", buffering=1 << 16)
+        except Exception:
+            return
+    try:
+        _csv_file.writelines(lines)
+    except Exception:
+        # If CSV logging fails, keep system running
+        pass
+
+
+def _csv_flush(force: bool = False) -> None:
+    """
+    Flush buffered CSV rows every CSV_FLUSH_S (or now, if forced).
+    """
+    global _csv_last_flush
+    if _csv_file is None:
+        return
+    now = time.monotonic()
+    if not force and now - _csv_last_flush < CSV_FLUSH_S:
+        return
+    _csv_last_flush = now
+    try:
+        _csv_file.flush()
+    except Exception:
+        pass
+
+
+def _csv_close() -> None:
+    global _csv_file
+    _csv_flush(force=True)
+    if _csv_file is not None:
+        try:
+            _csv_file.close()
+        except Exception:
+            pass
+        _csv_file = None
+
+
+atexit.register(_csv_close)
+
+
+def _install_sigterm_flush() -> None:
+    """
+    Flush buffered CSV rows as soon as SIGTERM arrives. Under gunicorn the
+    worker's own SIGTERM handler is already installed when this module is
+    imported, and lingering /video_feed streams can keep the worker alive
+    until it is SIGKILLed, so atexit alone may never run. Chain in front
+    of the existing handler instead of replacing it.
+    """
+    previous = signal.getsignal(signal.SIGTERM)
+
+    def _handler(signum, frame):
+        _csv_flush(force=True)
+        if callable(previous):
+            previous(signum, frame)
+        elif previous == signal.SIG_DFL:
+            sys.exit(0)
+
+    try:
+        signal.signal(signal.SIGTERM, _handler)
+    except ValueError:
+        # Not the main thread; atexit still covers normal exits
+        pass
+
+
+_install_sigterm_flush()
+
+
 def _safe_read_json(path: str) -> Optional[Dict[str, Any]]:
     try:
+        if orjson is not None:
+            with open(path, "rb") as f:
+                return orjson.loads(f.read())
         with open(path, "r", encoding="utf-8") as f:
             return json.load(f)
     except Exception:
         return None
 
 
+def _read_payload(path: str) -> Optional[Dict[str, Any]]:
+    """
+    Return the shared JSON payload, re-reading and re-parsing it only when
+    the file changed. The producer publishes with os.replace, so every
+    write shows up as a new inode/mtime; duplicate ticks cost one stat().
+    """
+    global _json_signature, _json_payload
+
+    try:
+        st = os.stat(path)
+    except Exception:
+        _json_signature, _json_payload = None, None
+        return None
+
+    signature = (st.st_ino, st.st_mtime_ns, st.st_size)
+    if signature != _json_signature:
+        # Remembered even when parsing fails: a published inode never
+        # changes, so the same file is not re-parsed every tick.
+        _json_payload = _safe_read_json(path)
+        _json_signature = signature
+
+    return _json_payload
+
+
 def _safe_read_bytes(path: str) -> Optional[bytes]:
     try:
         with open(path, "rb") as f:
@@ -118,6 +289,54 @@ def _safe_read_bytes(path: str) -> Optional[bytes]:
         return None
 
 
+# Layout shared with main_app.py: u64 seq | u32 length | 4 pad | JPEG.
+# seq is odd while the producer is writing.
+FRAME_SLOT_HEADER = struct.Struct("<QI4x")
+
+
+class SharedFrameSlotReader:
+    """
+    Reads the JPEG published by main_app.py alongside each payload.
+    Returns None when the slot is missing or has not changed for
+    STALE_JSON_S, so the caller can fall back to the camera file.
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self.mm: Optional[mmap.mmap] = None
+        self.seq: Optional[int] = None
+        self.frame: Optional[bytes] = None
+        self.changed_at = 0.0
+
+    def _open(self) -> bool:
+        try:
+            with open(self.path, "rb") as f:
+                self.mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            return True
+        except Exception:
+            self.mm = None
+            return False
+
+    def read(self) -> Optional[bytes]:
+        if self.mm is None and not self._open():
+            return None
+
+        now = time.monotonic()
+        seq, length = FRAME_SLOT_HEADER.unpack_from(self.mm, 0)
+
+        if seq != self.seq and not seq & 1:
+            start = FRAME_SLOT_HEADER.size
+            if 0 < length <= len(self.mm) - start:
+                data = self.mm[start:start + length]
+                # Keep the previous frame if the producer wrote meanwhile
+                if FRAME_SLOT_HEADER.unpack_from(self.mm, 0)[0] == seq:
+                    self.seq, self.frame, self.changed_at = seq, data, now
+
+        if self.frame is None or now - self.changed_at > STALE_JSON_S:
+            return None
+        return self.frame
+
+
 def _parse_iso_datetime(ts: str) -> Optional[datetime]:
     """
     Parse ISO-8601 with timezone when possible.
@@ -128,11 +347,10 @@ def _parse_iso_datetime(ts: str) -> Optional[datetime]:
         return None
 
 
-def _time_hhmmss(ts: str) -> str:
+def _time_hhmmss(dt: Optional[datetime]) -> str:
     """
-    Convert timestamp to HH:MM:SS for UI logs; falls back safely.
+    Format a parsed timestamp as HH:MM:SS for UI logs; falls back safely.
     """
-    dt = _parse_iso_datetime(ts) if ts else None
     if dt:
         return dt.strftime("%H:%M:%S")
     return datetime.now().strftime("%H:%M:%S")
@@ -158,6 +376,29 @@ def _load_font(size: int = 16) -> ImageFont.ImageFont:
 FONT = _load_font(16)
 
 
+@functools.lru_cache(maxsize=256)
+def _render_label(text: str) -> Image.Image:
+    """
+    Render a label tile (white text on red) once per unique text.
+    Labels are "person NN%", so the cache stays tiny.
+    """
+    pad = 4
+    tb = ImageDraw.Draw(Image.new("RGB", (1, 1))).textbbox((0, 0), text, font=FONT)
+    tw, th = tb[2] - tb[0], tb[3] - tb[1]
+
+    tile = Image.new("RGB", (tw + 2 * pad, th + 2 * pad), (255, 0, 0))
+    ImageDraw.Draw(tile).text((pad - tb[0], pad - tb[1]), text, fill="white", font=FONT)
+    return tile
+
+
+@functools.lru_cache(maxsize=256)
+def _render_label_array(text: str) -> "np.ndarray":
+    """
+    Same tile as _render_label, as an (h, w, 3) uint8 array.
+    """
+    return np.asarray(_render_label(text))
+
+
 def _generate_no_signal_frame() -> bytes:
     """
     Generate a "NO SIGNAL" JPEG in memory.
@@ -182,22 +423,19 @@ def _generate_no_signal_frame() -> bytes:
     return out.getvalue()
 
 
-def _overlay_detections(jpeg_bytes: bytes, payload: Dict[str, Any]) -> bytes:
-    """
-    Overlay person boxes + label on a JPEG frame. Uses Pillow only.
-    bbox format: [x, y, w, h] in pixels on 640x640.
-    """
-    try:
-        img = Image.open(io.BytesIO(jpeg_bytes)).convert("RGB")
-    except Exception:
-        return jpeg_bytes
+# Constant frame: built once, reused on every missing-frame tick
+NO_SIGNAL_JPEG = _generate_no_signal_frame()
 
-    draw = ImageDraw.Draw(img)
 
+def _person_boxes(payload: Dict[str, Any]) -> List[Tuple[int, int, int, int, float]]:
+    """
+    Extract valid person detections as (x, y, w, h, confidence).
+    """
     detections = payload.get("detections", [])
     if not isinstance(detections, list):
-        detections = []
+        return []
 
+    boxes: List[Tuple[int, int, int, int, float]] = []
     for det in detections:
         if not isinstance(det, dict):
             continue
@@ -219,36 +457,165 @@ def _overlay_detections(jpeg_bytes: bytes, payload: Dict[str, Any]) -> bytes:
         except Exception:
             conf_f = 0.0
 
-        # rectangle
+        boxes.append((x, y, w, h, conf_f))
+    return boxes
+
+
+_rejected_frame_sizes: set = set()
+
+
+def _jpeg_dimensions(data: bytes) -> Optional[Tuple[int, int]]:
+    """
+    Return (width, height) from the JPEG SOFn header without decoding.
+    """
+    if data[:2] != b"\xff\xd8":
+        return None
+
+    i, n = 2, len(data)
+    while i + 4 <= n:
+        if data[i] != 0xFF:
+            return None
+        marker = data[i + 1]
+        if marker == 0xFF:                                  # fill byte
+            i += 1
+            continue
+        if marker == 0x01 or 0xD0 <= marker <= 0xD7:        # no length field
+            i += 2
+            continue
+        if 0xC0 <= marker <= 0xCF and marker not in (0xC4, 0xC8, 0xCC):
+            if i + 9 > n:
+                return None
+            height = int.from_bytes(data[i + 5:i + 7], "big")
+            width = int.from_bytes(data[i + 7:i + 9], "big")
+            return width, height
+        if marker == 0xDA:                                  # scan data before SOF
+            return None
+        i += 2 + int.from_bytes(data[i + 2:i + 4], "big")
+    return None
+
+
+def _overlay_detections(jpeg_bytes: bytes, payload: Dict[str, Any]) -> bytes:
+    """
+    Overlay person boxes + label on a JPEG frame.
+    bbox format: [x, y, w, h] in pixels on 640x640.
+    Frames without person boxes, or not of the configured size, are
+    passed through without a decode.
+    """
+    boxes = _person_boxes(payload)
+    if not boxes:
+        return jpeg_bytes
+
+    # Bound decode cost: only frames of the configured size are decoded
+    size = _jpeg_dimensions(jpeg_bytes)
+    if size != (FRAME_WIDTH, FRAME_HEIGHT):
+        if size not in _rejected_frame_sizes:
+            _rejected_frame_sizes.add(size)
+            print(f"[WARN] Skipping overlay for frame of size {size}; "
+                  f"expected {(FRAME_WIDTH, FRAME_HEIGHT)}")
+        return jpeg_bytes
+
+    if _tj is not None:
+        return _overlay_turbo(jpeg_bytes, boxes)
+    return _overlay_pillow(jpeg_bytes, boxes)
+
+
+def _label_origin(x: int, y: int, tile_w: int, tile_h: int) -> Tuple[int, int]:
+    """
+    Place the label above the box if possible; otherwise inside.
+    """
+    ly = y - tile_h
+    if ly < 0:
+        ly = y + 2
+    lx = max(0, min(x, FRAME_WIDTH - tile_w))
+    return lx, ly
+
+
+def _fill(arr: "np.ndarray", y0: int, y1: int, x0: int, x1: int, color: Tuple[int, int, int]) -> None:
+    h, w = arr.shape[:2]
+    y0, y1 = max(0, y0), min(h, y1)
+    x0, x1 = max(0, x0), min(w, x1)
+    if y0 < y1 and x0 < x1:
+        arr[y0:y1, x0:x1] = color
+
+
+def _overlay_turbo(jpeg_bytes: bytes, boxes: List[Tuple[int, int, int, int, float]]) -> bytes:
+    """
+    Decode with libjpeg-turbo and draw straight into the RGB array with
+    slice assignments (no per-call Python draw dispatch), then re-encode.
+    No optimize pass: a second Huffman pass is wasted work on a live feed.
+    """
+    try:
+        frame = _tj.decode(jpeg_bytes, pixel_format=TJPF_RGB)
+    except Exception:
+        return jpeg_bytes
+
+    red = (255, 0, 0)
+    bw = 3  # box outline width
+
+    for x, y, w, h, conf_f in boxes:
+        # rectangle (inclusive corners, outline grows inward like ImageDraw)
         x2, y2 = x + w, y + h
-        draw.rectangle([x, y, x2, y2], outline="red", width=3)
+        _fill(frame, y, y + bw, x, x2 + 1, red)
+        _fill(frame, y2 - bw + 1, y2 + 1, x, x2 + 1, red)
+        _fill(frame, y, y2 + 1, x, x + bw, red)
+        _fill(frame, y, y2 + 1, x2 - bw + 1, x2 + 1, red)
+
+        # label tile, clipped to the frame
+        tile = _render_label_array(f"person {int(conf_f * 100)}%")
+        tile_h, tile_w = tile.shape[:2]
+        lx, ly = _label_origin(x, y, tile_w, tile_h)
 
-        # label with background
-        label = f"person {int(conf_f * 100)}%"
-        tb = draw.textbbox((0, 0), label, font=FONT)
-        tw, th = tb[2] - tb[0], tb[3] - tb[1]
-        pad = 4
+        fy0, fy1 = max(0, ly), min(frame.shape[0], ly + tile_h)
+        fx0, fx1 = max(0, lx), min(frame.shape[1], lx + tile_w)
+        if fy0 < fy1 and fx0 < fx1:
+            frame[fy0:fy1, fx0:fx1] = tile[fy0 - ly:fy1 - ly, fx0 - lx:fx1 - lx]
 
-        # place above the box if possible; otherwise inside
-        ly = y - (th + 2 * pad)
-        if ly < 0:
-            ly = y + 2
-        lx = max(0, min(x, FRAME_WIDTH - (tw + 2 * pad)))
+    try:
+        return _tj.encode(frame, quality=85, pixel_format=TJPF_RGB)
+    except Exception:
+        return jpeg_bytes
 
-        draw.rectangle([lx, ly, lx + tw + 2 * pad, ly + th + 2 * pad], fill="red")
-        draw.text((lx + pad, ly + pad), label, fill="white", font=FONT)
 
-    out = io.BytesIO()
-    img.save(out, format="JPEG", quality=85, optimize=True)
-    return out.getvalue()
+# Scratch encode buffer reused across frames (updater thread only)
+_encode_buf = io.BytesIO()
 
 
-def _payload_is_stale(payload: Dict[str, Any]) -> bool:
-    ts = payload.get("timestamp")
+def _overlay_pillow(jpeg_bytes: bytes, boxes: List[Tuple[int, int, int, int, float]]) -> bytes:
+    """
+    Fallback when libjpeg-turbo is unavailable.
+    """
+    try:
+        img = Image.open(io.BytesIO(jpeg_bytes)).convert("RGB")
+    except Exception:
+        return jpeg_bytes
+
+    draw = ImageDraw.Draw(img)
+
+    for x, y, w, h, conf_f in boxes:
+        # rectangle
+        x2, y2 = x + w, y + h
+        draw.rectangle([x, y, x2, y2], outline="red", width=3)
+
+        # label with background (pre-rendered tile)
+        tile = _render_label(f"person {int(conf_f * 100)}%")
+        img.paste(tile, _label_origin(x, y, *tile.size))
+
+    try:
+        _encode_buf.seek(0)
+        _encode_buf.truncate(0)
+        img.save(_encode_buf, format="JPEG", quality=85)
+        return _encode_buf.getvalue()
+    except Exception:
+        return jpeg_bytes
+
+
+def _payload_is_stale(ts: Any, dt: Optional[datetime]) -> bool:
+    """
+    ts is the raw payload timestamp, dt its parsed form (None if unparsable).
+    """
     if not isinstance(ts, str) or not ts:
         return True
 
-    dt = _parse_iso_datetime(ts)
     if not dt:
         return False  # if we can't parse, don't mark stale aggressively
 
@@ -256,168 +623,276 @@ def _payload_is_stale(payload: Dict[str, Any]) -> bool:
     return age > STALE_JSON_S
 
 
+def _open_inotify() -> Optional[Any]:
+    """
+    Watch the shared JSON directory for the producer's publish events.
+    main_app.py publishes only via os.replace (IN_MOVED_TO), so plain
+    closes (gst captures, .tmp writes) are not watched at all. Other
+    renames in the directory (camera_writer.sh's mv) still wake the
+    updater briefly and are dropped by name in _wait_for_update.
+    """
+    if INotify is None:
+        return None
+    try:
+        inotify = INotify()
+        inotify.add_watch(os.path.dirname(SHARED_JSON_PATH), inotify_flags.MOVED_TO)
+        return inotify
+    except Exception:
+        return None
+
+
+def _wait_for_update(inotify: Optional[Any], timeout_s: float) -> None:
+    """
+    Block until the shared JSON is rewritten or timeout_s elapses.
+    Falls back to a plain sleep when inotify is unavailable.
+    """
+    if inotify is None:
+        time.sleep(timeout_s)
+        return
+
+    json_name = os.path.basename(SHARED_JSON_PATH)
+    deadline = time.monotonic() + timeout_s
+    while True:
+        remaining_ms = int((deadline - time.monotonic()) * 1000)
+        if remaining_ms <= 0:
+            return
+        try:
+            events = inotify.read(timeout=remaining_ms)
+        except Exception:
+            time.sleep(max(0.0, deadline - time.monotonic()))
+            return
+        if any(ev.name == json_name for ev in events):
+            return
+
+
+def _mjpeg_chunk(jpeg: bytes) -> bytes:
+    return b"--frame\r\nContent-Type: image/jpeg\r\n\r\n" + jpeg + b"\r\n"
+
+
+NO_SIGNAL_CHUNK = _mjpeg_chunk(NO_SIGNAL_JPEG)
+
+
+def _publish(**changes: Any) -> None:
+    """
+    Publish a new state snapshot (copy-on-write; updater thread only).
+    The multipart chunk is framed here once, not per client per frame.
+    """
+    global _latest_state
+    if "jpeg" in changes and changes["jpeg"] is not _latest_state["jpeg"]:
+        changes["mjpeg"] = _mjpeg_chunk(changes["jpeg"])
+    state = dict(_latest_state)
+    state.update(changes)
+    _latest_state = state
+
+
+def _stats_snapshot(detections_changed: bool) -> Dict[str, Any]:
+    """
+    Serialize the stats views served by the API from updater state, once
+    per processed payload rather than once per request. The logs and
+    detection_stats views only change when a person was added; otherwise
+    their previous bytes and version (ETag) stay in the published state.
+    """
+    global stats_version
+    stats_version += 1
+
+    avg_latency = (sum(latency_window) / len(latency_window)) if latency_window else 0.0
+    views = {
+        "stats_version": stats_version,
+        "perf_version": stats_version,
+        "stats": _dumps({
+            "fps": round(float(last_fps), 2),
+            "avg_inference_time": round(float(avg_latency), 2),
+            "detections_count": int(total_detections),
+            "dropped_payloads": int(dropped_payloads)
+        }),
+        "perf": _dumps(list(performance_history)),
+    }
+    if detections_changed:
+        views["detection_stats"] = _dumps({"class_counts": {"person": int(total_detections)}})
+        views["logs"] = _dumps({"logs": list(recent_logs)})
+        views["detection_stats_version"] = stats_version
+        views["logs_version"] = stats_version
+    return views
+
+
 # ---------------------------------------------------------------------
 # Background Updater (single source of truth)
 # ---------------------------------------------------------------------
 
+def _missed_payloads(payload: Dict[str, Any], after: int, before: int) -> List[Dict[str, Any]]:
+    """
+    Entries of payload["history"] with after < seq < before, oldest first.
+    """
+    history = payload.get("history")
+    if not isinstance(history, list):
+        return []
+    missed = [
+        h for h in history
+        if isinstance(h, dict) and isinstance(h.get("seq"), int) and after < h["seq"] < before
+    ]
+    missed.sort(key=lambda h: h["seq"])
+    return missed
+
+
+def _skip_payload(payload: Optional[Dict[str, Any]]) -> None:
+    """
+    Mark a payload as consumed without accounting it (no frame / stale),
+    so the next processed seq does not count it as dropped or replay it.
+    """
+    global last_payload_processed
+    seq = payload.get("seq") if isinstance(payload, dict) else None
+    if isinstance(seq, int):
+        last_payload_processed = seq
+
+
+def _account_payload(payload: Dict[str, Any], ts_dt: Optional[datetime]) -> List[str]:
+    """
+    Fold one payload into the rolling stats, perf history and logs.
+    Returns its CSV rows (detections-only).
+    """
+    global total_detections, last_fps
+
+    ts = payload.get("timestamp")
+
+    # Update rolling stats
+    fps_val = payload.get("fps", 0.0)
+    lat_ms = payload.get("latency_ms", 0.0)
+
+    try:
+        last_fps = float(fps_val)
+    except Exception:
+        last_fps = 0.0
+
+    try:
+        lat_ms_f = float(lat_ms)
+    except Exception:
+        lat_ms_f = 0.0
+
+    latency_window.append(lat_ms_f)
+
+    # Performance history (optional)
+    sysinfo = payload.get("system", {})
+    cpu = None
+    mem = None
+    if isinstance(sysinfo, dict):
+        cpu = sysinfo.get("cpu_percent", None)
+        mem = sysinfo.get("memory_percent", None)
+
+    try:
+        cpu_f = float(cpu) if cpu is not None else 0.0
+    except Exception:
+        cpu_f = 0.0
+
+    try:
+        mem_f = float(mem) if mem is not None else 0.0
+    except Exception:
+        mem_f = 0.0
+
+    performance_history.append({"cpu": cpu_f, "memory": mem_f})
+
+    # Logs + CSV (detections-only)
+    time_str = _time_hhmmss(ts_dt)
+    csv_lines: List[str] = []
+
+    for x, y, w, h, conf_f in _person_boxes(payload):
+        recent_logs.appendleft({
+            "time": time_str,           # UI expects a displayable time string
+            "class": "person",
+            "confidence": conf_f,
+            "inference_time": lat_ms_f
+        })
+
+        csv_lines.append(
+            f"{ts},person,{conf_f},{x},{y},{w},{h},{lat_ms_f},{last_fps},{cpu_f},{mem_f}\n"
+        )
+
+    total_detections += len(csv_lines)
+    return csv_lines
+
+
 def _background_updater() -> None:
     """
     Single updater loop:
     - reads latest frame + payload
     - overlays detections
-    - updates cached annotated frame
     - updates stats/logs/perf history
+    - publishes a new state snapshot (annotated frame + API views)
     - appends CSV rows (detections-only)
     """
-    global cached_annotated_jpeg, cached_last_frame_ok
-    global total_detections, last_fps
-    global last_payload_timestamp_processed
+    global last_payload_processed, dropped_payloads
 
     _ensure_csv_header()
+    inotify = _open_inotify()
+    frame_slot = SharedFrameSlotReader(SHARED_FRAME_SLOT_PATH)
 
     # Initialize cached frame so /video_feed always has something
-    with state_lock:
-        cached_annotated_jpeg = _generate_no_signal_frame()
-        cached_last_frame_ok = False
+    _publish(jpeg=NO_SIGNAL_JPEG, frame_ok=False)
+
+    overlay_frame: Optional[bytes] = None    # inputs of the last overlay
+    overlay_payload: Optional[Dict[str, Any]] = None
+    annotated = b""
 
     while True:
-        frame_bytes = _safe_read_bytes(SHARED_FRAME_PATH)
-        payload = _safe_read_json(SHARED_JSON_PATH)
+        # Block until the producer publishes (or the fallback tick). A
+        # publish during the previous iteration is already queued as an
+        # inotify event, so this returns immediately in that case.
+        _wait_for_update(inotify, UPDATER_SLEEP)
+
+        _csv_flush()
+
+        frame_bytes = frame_slot.read() or _safe_read_bytes(SHARED_FRAME_PATH)
+        payload = _read_payload(SHARED_JSON_PATH)
 
         # If no frame, show NO SIGNAL. Keep API state unchanged unless payload is valid.
         if frame_bytes is None:
-            annotated = _generate_no_signal_frame()
-            with state_lock:
-                cached_annotated_jpeg = annotated
-                cached_last_frame_ok = False
-            time.sleep(UPDATER_SLEEP)
+            _skip_payload(payload)
+            _publish(jpeg=NO_SIGNAL_JPEG, frame_ok=False)
             continue
 
+        # Parse the timestamp once per tick; reused for staleness + log times
+        ts = payload.get("timestamp") if isinstance(payload, dict) else None
+        ts_dt = _parse_iso_datetime(ts) if isinstance(ts, str) and ts else None
+
         # If payload missing or stale, stream raw frame without overlay.
-        if payload is None or not isinstance(payload, dict) or _payload_is_stale(payload):
-            with state_lock:
-                cached_annotated_jpeg = frame_bytes
-                cached_last_frame_ok = True
-            time.sleep(UPDATER_SLEEP)
+        if payload is None or not isinstance(payload, dict) or _payload_is_stale(ts, ts_dt):
+            _skip_payload(payload)
+            _publish(jpeg=frame_bytes, frame_ok=True)
             continue
 
-        # Overlay detections
-        annotated = _overlay_detections(frame_bytes, payload)
-
-        # Update cached annotated frame
-        with state_lock:
-            cached_annotated_jpeg = annotated
-            cached_last_frame_ok = True
-
-        # Process payload ONCE per unique timestamp (prevents double-logging on slow updates)
-        ts = payload.get("timestamp")
-        if isinstance(ts, str) and ts and ts != last_payload_timestamp_processed:
-            last_payload_timestamp_processed = ts
-
-            # Update rolling stats
-            fps_val = payload.get("fps", 0.0)
-            lat_ms = payload.get("latency_ms", 0.0)
-
-            try:
-                last_fps = float(fps_val)
-            except Exception:
-                last_fps = 0.0
-
-            try:
-                lat_ms_f = float(lat_ms)
-            except Exception:
-                lat_ms_f = 0.0
+        # Overlay detections (unchanged frame + payload reuse the last result)
+        if frame_bytes is not overlay_frame or payload is not overlay_payload:
+            annotated = _overlay_detections(frame_bytes, payload)
+            overlay_frame, overlay_payload = frame_bytes, payload
+
+        # Process payload ONCE per producer seq (timestamp for older
+        # producers); prevents double-logging on slow updates
+        seq = payload.get("seq")
+        payload_key = seq if isinstance(seq, int) else ts
+        if not (isinstance(ts, str) and ts and payload_key != last_payload_processed):
+            _publish(jpeg=annotated, frame_ok=True)
+            continue
 
-            with state_lock:
-                latency_window.append(lat_ms_f)
+        # The single JSON file keeps only the newest payload; ones it
+        # replaced before this updater read them are replayed from the
+        # producer's "history". Older gaps are counted as dropped.
+        csv_lines: List[str] = []
+        if isinstance(seq, int) and isinstance(last_payload_processed, int) \
+                and seq > last_payload_processed + 1:
+            missed = _missed_payloads(payload, last_payload_processed, seq)
+            dropped_payloads += seq - last_payload_processed - 1 - len(missed)
+            for old in missed:
+                old_ts = old.get("timestamp")
+                old_dt = _parse_iso_datetime(old_ts) if isinstance(old_ts, str) and old_ts else None
+                csv_lines += _account_payload(old, old_dt)
 
-            # Performance history (optional)
-            sysinfo = payload.get("system", {})
-            cpu = None
-            mem = None
-            if isinstance(sysinfo, dict):
-                cpu = sysinfo.get("cpu_percent", None)
-                mem = sysinfo.get("memory_percent", None)
+        last_payload_processed = payload_key
+        csv_lines += _account_payload(payload, ts_dt)
 
-            try:
-                cpu_f = float(cpu) if cpu is not None else 0.0
-            except Exception:
-                cpu_f = 0.0
+        # Publish frame + API views together as one snapshot
+        _publish(jpeg=annotated, frame_ok=True, **_stats_snapshot(bool(csv_lines)))
 
-            try:
-                mem_f = float(mem) if mem is not None else 0.0
-            except Exception:
-                mem_f = 0.0
-
-            with state_lock:
-                performance_history.append({"cpu": cpu_f, "memory": mem_f})
-
-            # Logs + CSV (detections-only)
-            detections = payload.get("detections", [])
-            if not isinstance(detections, list):
-                detections = []
-
-            time_str = _time_hhmmss(ts)
-
-            # Collect CSV lines and apply state updates under lock once
-            csv_lines: List[str] = []
-            new_log_entries: List[Dict[str, Any]] = []
-            new_detections_count = 0
-
-            for det in detections:
-                if not isinstance(det, dict):
-                    continue
-                if det.get("class") != "person":
-                    continue
-
-                bbox = det.get("bbox")
-                if not (isinstance(bbox, list) and len(bbox) == 4):
-                    continue
-
-                try:
-                    x, y, w, h = [int(round(float(v))) for v in bbox]
-                except Exception:
-                    continue
-
-                conf = det.get("confidence", 0.0)
-                try:
-                    conf_f = float(conf)
-                except Exception:
-                    conf_f = 0.0
-
-                new_detections_count += 1
-
-                new_log_entries.append({
-                    "time": time_str,           # UI expects a displayable time string
-                    "class": "person",
-                    "confidence": conf_f,
-                    "inference_time": lat_ms_f
-                })
-
-                csv_lines.append(
-                    f"{ts},person,{conf_f},{x},{y},{w},{h},{lat_ms_f},{last_fps},{cpu_f},{mem_f}\n"
-                )
-
-            if new_detections_count > 0:
-                with state_lock:
-                    # Update totals and in-memory logs
-                    nonlocal_total = new_detections_count
-                    # (explicit variable to keep it clear)
-                    total_detections_update = nonlocal_total
-                    total_detections += total_detections_update
-
-                    for entry in new_log_entries:
-                        recent_logs.appendleft(entry)
-
-                # Append CSV outside lock (I/O can block)
-                try:
-                    with open(CSV_LOG_PATH, "a", encoding="utf-8") as f:
-                        f.writelines(csv_lines)
-                except Exception:
-                    # If CSV logging fails, keep system running
-                    pass
-
-        time.sleep(UPDATER_SLEEP)
+        if csv_lines:
+            _csv_write(csv_lines)
 
 
 # Start background updater thread once, at import time (safe for Flask run)
@@ -444,44 +919,42 @@ def video_feed():
     def generate():
         delay = 1.0 / max(1.0, TARGET_FPS)
         while True:
-            with state_lock:
-                frame = cached_annotated_jpeg or _generate_no_signal_frame()
-
-            yield (b"--frame\r\n"
-                   b"Content-Type: image/jpeg\r\n\r\n" + frame + b"\r\n")
+            yield _latest_state["mjpeg"] or NO_SIGNAL_CHUNK
 
             time.sleep(delay)
 
     return Response(generate(), mimetype="multipart/x-mixed-replace; boundary=frame")
 
 
+def _json_response(key: str) -> Response:
+    """
+    Serve a pre-serialized API view; its own ETag (changes only when
+    that view is rebuilt) lets pollers get 304s.
+    """
+    state = _latest_state
+    resp = Response(state[key], mimetype="application/json")
+    resp.set_etag(_etag_prefix + str(state[key + "_version"]))
+    return resp.make_conditional(request)
+
+
 @app.route("/api/stats")
 def api_stats():
-    with state_lock:
-        avg_latency = (sum(latency_window) / len(latency_window)) if latency_window else 0.0
-        return jsonify({
-            "fps": round(float(last_fps), 2),
-            "avg_inference_time": round(float(avg_latency), 2),
-            "detections_count": int(total_detections)
-        })
+    return _json_response("stats")
 
 
 @app.route("/api/logs")
 def api_logs():
-    with state_lock:
-        return jsonify({"logs": list(recent_logs)})
+    return _json_response("logs")
 
 
 @app.route("/api/detection_stats")
 def api_detection_stats():
-    with state_lock:
-        return jsonify({"class_counts": {"person": int(total_detections)}})
+    return _json_response("detection_stats")
 
 
 @app.route("/api/performance_history")
 def api_performance_history():
-    with state_lock:
-        return jsonify(list(performance_history))
+    return _json_response("perf")
 
 
 # ---------------------------------------------------------------------
@@ -489,4 +962,5 @@ def api_performance_history():
 # ---------------------------------------------------------------------
 
 if __name__ == "__main__":
+    # SIGTERM is handled by _install_sigterm_flush (flush, then sys.exit)
     app.run(host=HOST, port=PORT, debug=False, threaded=True)
\ No newline at end of file
@@ -1,10 +1,17 @@
 #!/usr/bin/env python3
 # main_app.py
 
+import io
+import itertools
 import json
+import mmap
 import os
+import queue
+import struct
+import threading
 import time
 import signal
+from collections import deque
 from pathlib import Path
 from datetime import datetime
 
@@ -15,11 +22,31 @@ import tensorrt as trt
 import pycuda.driver as cuda
 import pycuda.autoinit
 
+try:
+    from pycuda.compiler import SourceModule
+except Exception:
+    SourceModule = None
+
 try:
     import psutil
 except Exception:
     psutil = None
 
+try:
+    import orjson
+except Exception:
+    orjson = None
+
+try:
+    from numba import njit
+except Exception:
+    njit = None
+
+try:
+    from inotify_simple import INotify, flags as inotify_flags
+except Exception:
+    INotify = None
+
 
 # ------------------------------------------------------------
 # Configuration
@@ -34,12 +61,29 @@ with open(CONFIG_PATH, "r") as f:
 TARGET_FPS = float(CONFIG["runtime"]["target_fps"])
 SHARED_FRAME_PATH = CONFIG["paths"]["shared_frame"]
 SHARED_JSON_PATH = CONFIG["paths"]["shared_json"]
+SHARED_FRAME_SLOT_PATH = CONFIG["paths"]["shared_frame_slot"]
 ENGINE_PATH = CONFIG["mode"]["engine_path"]
+# "auto": report the engine's binding dtype; otherwise checked against it
+PRECISION = str(CONFIG["mode"].get("precision", "auto")).lower()
+ZERO_COPY = CONFIG["mode"].get("zero_copy", "auto")
 
 CONF_THRESHOLD = float(CONFIG.get("detection", {}).get("conf_threshold", 0.3))
 
-MODEL_W = 640
-MODEL_H = 640
+# Optional: pin inference to CPUs / run it SCHED_FIFO (0 = leave as is)
+CPU_AFFINITY = CONFIG.get("scheduling", {}).get("cpu_affinity") or []
+RT_PRIORITY = int(CONFIG.get("scheduling", {}).get("realtime_priority", 0))
+
+FRAME_W = int(CONFIG["runtime"]["frame_width"])
+FRAME_H = int(CONFIG["runtime"]["frame_height"])
+
+# Local timezone resolved once; astimezone() re-reads it every call
+_TZ = datetime.now().astimezone().tzinfo
+
+# Depth of the capture -> inference and inference -> publish queues
+FRAME_QUEUE_SIZE = 2
+
+# Shared frame slot: header + room for an uncompressed-size JPEG
+FRAME_SLOT_CAPACITY = FRAME_W * FRAME_H * 3
 
 
 # ------------------------------------------------------------
@@ -60,17 +104,261 @@ signal.signal(signal.SIGTERM, _stop_handler)
 # Atomic JSON Write
 # ------------------------------------------------------------
 
+_payload_seq = itertools.count(1)
+
+# Previous payloads re-sent under "history" (oldest first), so a reader
+# that missed a few publishes of the single JSON file can replay them.
+PAYLOAD_HISTORY = 8
+_payload_history = deque(maxlen=PAYLOAD_HISTORY)
+
+
+def publish_payload(payload):
+    """
+    Stamp a monotonically increasing seq (lets the dashboard process each
+    payload exactly once), attach the recent history and publish
+    atomically. Publisher thread only.
+    """
+    payload["seq"] = next(_payload_seq)
+    payload["history"] = list(_payload_history)
+    write_json_atomic(payload, SHARED_JSON_PATH)
+    _payload_history.append({k: v for k, v in payload.items() if k != "history"})
+
+
 def write_json_atomic(data, path):
     tmp = path + ".tmp"
-    with open(tmp, "w") as f:
-        json.dump(data, f)
+    if orjson is not None:
+        body = orjson.dumps(data, option=orjson.OPT_SERIALIZE_NUMPY)
+    else:
+        body = json.dumps(data).encode("utf-8")
+    # Raw fd, normally a single write(); no buffered file object per frame.
+    # A short write (e.g. tmpfs nearly full) is continued, and the error
+    # it leads to raises before os.replace could publish truncated JSON.
+    fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+    try:
+        view = memoryview(body)
+        while view:
+            view = view[os.write(fd, view):]
+    finally:
+        os.close(fd)
     os.replace(tmp, path)
 
 
+# ------------------------------------------------------------
+# Shared Frame Slot (mmap)
+# ------------------------------------------------------------
+
+# Layout shared with dashboard/dashboard_server.py:
+#   u64 seq | u32 length | 4 pad | JPEG payload
+# seq is odd while a write is in progress (seqlock); readers retry or
+# keep their previous frame when seq is odd or changes under them.
+FRAME_SLOT_HEADER = struct.Struct("<QI4x")
+
+
+class SharedFrameSlot:
+    """
+    Publishes the JPEG each payload was computed from, so the dashboard
+    reads memory instead of re-opening the camera file every frame.
+    """
+
+    def __init__(self, path, capacity):
+
+        size = FRAME_SLOT_HEADER.size + capacity
+
+        fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            if os.fstat(fd).st_size != size:
+                os.ftruncate(fd, size)
+            self.mm = mmap.mmap(fd, size)
+        finally:
+            os.close(fd)
+
+        self.capacity = capacity
+        # Continue the sequence across restarts so readers see a change
+        self.seq = FRAME_SLOT_HEADER.unpack_from(self.mm, 0)[0] & ~1
+
+
+    def write(self, data):
+
+        length = len(data)
+        if length > self.capacity:
+            return False
+
+        self.seq += 1
+        FRAME_SLOT_HEADER.pack_into(self.mm, 0, self.seq, 0)
+
+        start = FRAME_SLOT_HEADER.size
+        self.mm[start:start + length] = data
+
+        self.seq += 1
+        FRAME_SLOT_HEADER.pack_into(self.mm, 0, self.seq, length)
+
+        return True
+
+
+# ------------------------------------------------------------
+# GPU Preprocessing
+# ------------------------------------------------------------
+
+# uint8 HWC RGB (any size) -> bilinear resize -> float CHW / 255, fused
+# and written straight into the engine input binding. Only the raw
+# decoded frame crosses to the device. One entry point per supported
+# input dtype (FP32 and FP16 I/O engines).
+PREPROCESS_KERNEL_SRC = r"""
+#include <cuda_fp16.h>
+
+__device__ inline void store(float *dst, int i, float v) { dst[i] = v; }
+__device__ inline void store(__half *dst, int i, float v) { dst[i] = __float2half(v); }
+
+template <typename T>
+__device__ void resize_hwc_u8_to_chw(const unsigned char *src, int src_w, int src_h,
+                                     T *dst, int width, int height)
+{
+    int x = blockIdx.x * blockDim.x + threadIdx.x;
+    int y = blockIdx.y * blockDim.y + threadIdx.y;
+    if (x >= width || y >= height)
+        return;
+
+    // Bilinear sample (pixel centers aligned); exact copy when sizes match
+    float sx = (x + 0.5f) * ((float)src_w / width) - 0.5f;
+    float sy = (y + 0.5f) * ((float)src_h / height) - 0.5f;
+    sx = fminf(fmaxf(sx, 0.0f), src_w - 1.0f);
+    sy = fminf(fmaxf(sy, 0.0f), src_h - 1.0f);
+
+    int x0 = (int)sx, y0 = (int)sy;
+    int x1 = min(x0 + 1, src_w - 1), y1 = min(y0 + 1, src_h - 1);
+    float fx = sx - x0, fy = sy - y0;
+
+    const unsigned char *p00 = src + (y0 * src_w + x0) * 3;
+    const unsigned char *p01 = src + (y0 * src_w + x1) * 3;
+    const unsigned char *p10 = src + (y1 * src_w + x0) * 3;
+    const unsigned char *p11 = src + (y1 * src_w + x1) * 3;
+
+    int plane = width * height;
+    int idx = y * width + x;
+    const float scale = 1.0f / 255.0f;
+
+    for (int c = 0; c < 3; ++c) {
+        float top = p00[c] + (p01[c] - p00[c]) * fx;
+        float bottom = p10[c] + (p11[c] - p10[c]) * fx;
+        store(dst, c * plane + idx, (top + (bottom - top) * fy) * scale);
+    }
+}
+
+extern "C" {
+
+__global__ void hwc_u8_to_chw_f32(const unsigned char *src, int src_w, int src_h,
+                                  float *dst, int width, int height)
+{
+    resize_hwc_u8_to_chw<float>(src, src_w, src_h, dst, width, height);
+}
+
+__global__ void hwc_u8_to_chw_f16(const unsigned char *src, int src_w, int src_h,
+                                  __half *dst, int width, int height)
+{
+    resize_hwc_u8_to_chw<__half>(src, src_w, src_h, dst, width, height);
+}
+
+}
+"""
+
+PREPROCESS_KERNELS = {
+    np.dtype(np.float32): "hwc_u8_to_chw_f32",
+    np.dtype(np.float16): "hwc_u8_to_chw_f16",
+}
+
+PREPROCESS_BLOCK = (16, 16, 1)
+
+
+def build_preprocess_kernel(dtype):
+    """
+    Compile the preprocessing kernel for the engine input dtype. Returns
+    None when nvcc is unavailable or the dtype is unsupported, in which
+    case frames are normalized on the CPU.
+    """
+    name = PREPROCESS_KERNELS.get(np.dtype(dtype))
+    if SourceModule is None or name is None:
+        return None
+    try:
+        module = SourceModule(PREPROCESS_KERNEL_SRC, no_extern_c=True)
+        return module.get_function(name)
+    except Exception as e:
+        print("GPU preprocessing unavailable, using CPU:", e)
+        return None
+
+
 # ------------------------------------------------------------
 # TensorRT Engine
 # ------------------------------------------------------------
 
+def mapped_empty(shape, dtype):
+    """
+    Pinned host array the GPU can address directly (zero-copy).
+    Returns (array, device pointer).
+    """
+    arr = cuda.pagelocked_empty(shape, dtype=dtype, mem_flags=cuda.host_alloc_flags.DEVICEMAP)
+    return arr, np.intp(arr.base.get_device_pointer())
+
+
+def use_zero_copy():
+    """
+    mode.zero_copy: "auto" (integrated GPUs, i.e. Jetson), true or false.
+    """
+    if str(ZERO_COPY).lower() == "auto":
+        return bool(pycuda.autoinit.device.get_attribute(cuda.device_attribute.INTEGRATED))
+    return str(ZERO_COPY).lower() in ("1", "true", "yes")
+
+
+class InferenceSlot:
+    """
+    One set of I/O buffers + stream. TRTInference alternates between two
+    slots so one frame's copies overlap with the other's execution.
+
+    With zero_copy (CPU and GPU share DRAM) the host staging and output
+    buffers are mapped into the device address space and the HtoD/DtoH
+    copies are skipped entirely.
+    """
+
+    def __init__(self, engine, input_shape, input_dtype, output_shape, output_dtype,
+                 frame_capacity, input_index, output_index, gpu_preprocess, zero_copy):
+
+        self.stream = cuda.Stream()
+        self.zero_copy = zero_copy
+
+        if zero_copy:
+            self.output_host, self.d_output = mapped_empty(output_shape, output_dtype)
+        else:
+            self.output_host = cuda.pagelocked_empty(output_shape, dtype=output_dtype)
+            self.d_output = cuda.mem_alloc(self.output_host.nbytes)
+
+        # Staging for the uploaded data: flat uint8 frame bytes of up to
+        # frame_capacity (GPU preprocessing) or the finished input tensor.
+        # Pinned so HtoD is truly asynchronous.
+        staging_shape, staging_dtype = (
+            ((frame_capacity,), np.uint8) if gpu_preprocess else (input_shape, input_dtype)
+        )
+
+        if zero_copy:
+            self.input_host, d_staging = mapped_empty(staging_shape, staging_dtype)
+        else:
+            self.input_host = cuda.pagelocked_empty(staging_shape, dtype=staging_dtype)
+            d_staging = cuda.mem_alloc(self.input_host.nbytes)
+
+        if gpu_preprocess:
+            self.d_frame = d_staging
+            self.d_input = cuda.mem_alloc(
+                trt.volume(input_shape) * np.dtype(input_dtype).itemsize
+            )
+        else:
+            self.d_frame = None
+            self.d_input = d_staging
+
+        # Bindings list for execute_async_v2 (TensorRT < 8.5)
+        num_io = engine.num_io_tensors if hasattr(engine, "num_io_tensors") else engine.num_bindings
+        self.bindings = [0] * num_io
+        self.bindings[input_index] = int(self.d_input)
+        self.bindings[output_index] = int(self.d_output)
+
+
 class TRTInference:
 
     def __init__(self, engine_path):
@@ -88,179 +376,688 @@ class TRTInference:
         if self.engine is None:
             raise RuntimeError("Failed to deserialize engine")
 
-        self.context = self.engine.create_execution_context()
+        # Context scratch memory comes from one explicitly owned buffer,
+        # sized once; further engines/contexts can share it (max size).
+        self.workspace = cuda.mem_alloc(max(1, self.engine.device_memory_size))
+        self.context = self.engine.create_execution_context_without_device_memory()
+        self.context.device_memory = int(self.workspace)
 
         self.input_index = 0
         self.output_index = 1
 
-        self.input_shape = tuple(self.engine.get_binding_shape(self.input_index))
-        self.output_shape = tuple(self.engine.get_binding_shape(self.output_index))
+        # TensorRT >= 8.5: name-based I/O + execute_async_v3; the
+        # binding-index API (JetPack 4.6 / TRT 8.2) is the fallback.
+        self.use_v3 = hasattr(self.context, "execute_async_v3")
 
-        self.input_dtype = trt.nptype(self.engine.get_binding_dtype(self.input_index))
-        self.output_dtype = trt.nptype(self.engine.get_binding_dtype(self.output_index))
+        if self.use_v3:
+            self.input_name = self.engine.get_tensor_name(self.input_index)
+            self.output_name = self.engine.get_tensor_name(self.output_index)
 
-        self.d_input = cuda.mem_alloc(
-            int(np.prod(self.input_shape)) * np.dtype(self.input_dtype).itemsize
-        )
+            self.input_shape = tuple(self.engine.get_tensor_shape(self.input_name))
+            self.output_shape = tuple(self.engine.get_tensor_shape(self.output_name))
 
-        self.d_output = cuda.mem_alloc(
-            int(np.prod(self.output_shape)) * np.dtype(self.output_dtype).itemsize
-        )
+            self.input_dtype = trt.nptype(self.engine.get_tensor_dtype(self.input_name))
+            self.output_dtype = trt.nptype(self.engine.get_tensor_dtype(self.output_name))
 
-        self.output_host = cuda.pagelocked_empty(
-            self.output_shape,
-            dtype=self.output_dtype
-        )
+        else:
+            self.input_shape = tuple(self.engine.get_binding_shape(self.input_index))
+            self.output_shape = tuple(self.engine.get_binding_shape(self.output_index))
 
-        self.bindings = [0] * self.engine.num_bindings
-        self.bindings[self.input_index] = int(self.d_input)
-        self.bindings[self.output_index] = int(self.d_output)
+            self.input_dtype = trt.nptype(self.engine.get_binding_dtype(self.input_index))
+            self.output_dtype = trt.nptype(self.engine.get_binding_dtype(self.output_index))
 
-        self.stream = cuda.Stream()
+        # Device-side preprocessing writes the engine input dtype directly.
+        # Frames up to frame_capacity bytes are resized on the GPU; larger
+        # ones are first resized to model size on the CPU (submit).
+        _, _, self.model_h, self.model_w = self.input_shape
+        self.frame_capacity = max(FRAME_W * FRAME_H, self.model_w * self.model_h) * 3
+
+        self.preprocess_kernel = build_preprocess_kernel(self.input_dtype)
+
+        self.preprocess_grid = (
+            (self.model_w + PREPROCESS_BLOCK[0] - 1) // PREPROCESS_BLOCK[0],
+            (self.model_h + PREPROCESS_BLOCK[1] - 1) // PREPROCESS_BLOCK[1],
+            1
+        )
+
+        self.zero_copy = use_zero_copy()
+
+        # Double-buffered I/O. The single execution context is shared, so
+        # enqueues are ordered through exec_done; copies still overlap.
+        self.slots = [
+            InferenceSlot(
+                self.engine,
+                self.input_shape, self.input_dtype,
+                self.output_shape, self.output_dtype,
+                self.frame_capacity,
+                self.input_index, self.output_index,
+                self.preprocess_kernel is not None,
+                self.zero_copy
+            )
+            for _ in range(2)
+        ]
+        self.next_slot = 0
+        self.exec_done = cuda.Event()
 
         print("Engine Loaded")
-        print("Input shape:", self.input_shape)
-        print("Output shape:", self.output_shape)
+        print("Input shape:", self.input_shape, np.dtype(self.input_dtype).name)
+        print("Output shape:", self.output_shape, np.dtype(self.output_dtype).name)
+        print("Zero-copy I/O:", self.zero_copy)
+        print("Enqueue API:", "execute_async_v3" if self.use_v3 else "execute_async_v2")
+        print("Context memory:", self.engine.device_memory_size, "bytes")
+
+
+    def submit(self, frame):
+        """
+        Enqueue one frame without blocking. Returns a handle for wait().
+        At most two frames may be in flight.
+        """
+
+        if frame.ndim != 3 or frame.shape[2] != 3 or frame.dtype != np.uint8:
+            raise ValueError(f"Expected uint8 HxWx3 frame, got {frame.dtype} {frame.shape}")
+
+        handle = self.next_slot
+        self.next_slot ^= 1
+        slot = self.slots[handle]
+
+        if self.preprocess_kernel is not None:
+            # Oversized frames are shrunk to model size on the CPU first;
+            # a model-size frame always fits the uint8 staging buffer.
+            if frame.nbytes > self.frame_capacity:
+                frame = resize_frame(frame, self.model_w, self.model_h)
+            frame_h, frame_w = frame.shape[:2]
+            staged = slot.input_host[:frame.nbytes].reshape(frame.shape)
+            np.copyto(staged, frame)
+            if not slot.zero_copy:
+                cuda.memcpy_htod_async(slot.d_frame, staged, slot.stream)
+            self.preprocess_kernel(
+                slot.d_frame,
+                np.int32(frame_w),
+                np.int32(frame_h),
+                slot.d_input,
+                np.int32(self.model_w),
+                np.int32(self.model_h),
+                block=PREPROCESS_BLOCK,
+                grid=self.preprocess_grid,
+                stream=slot.stream
+            )
+        else:
+            frame = resize_frame(frame, self.model_w, self.model_h)
+            normalize_chw(frame, slot.input_host)
+            if not slot.zero_copy:
+                cuda.memcpy_htod_async(slot.d_input, slot.input_host, slot.stream)
+
+        slot.stream.wait_for_event(self.exec_done)
+
+        if self.use_v3:
+            # Addresses are read at enqueue; re-pointed per slot
+            self.context.set_tensor_address(self.input_name, int(slot.d_input))
+            self.context.set_tensor_address(self.output_name, int(slot.d_output))
+            ok = self.context.execute_async_v3(stream_handle=slot.stream.handle)
+        else:
+            ok = self.context.execute_async_v2(
+                bindings=slot.bindings,
+                stream_handle=slot.stream.handle
+            )
 
+        if not ok:
+            raise RuntimeError("TensorRT execution failed")
 
-    def infer(self, inp):
+        self.exec_done.record(slot.stream)
 
-        inp = np.ascontiguousarray(inp, dtype=self.input_dtype)
+        if not slot.zero_copy:
+            cuda.memcpy_dtoh_async(slot.output_host, slot.d_output, slot.stream)
 
-        if tuple(inp.shape) != self.input_shape:
-            raise ValueError(f"Input shape mismatch: {inp.shape} vs {self.input_shape}")
+        return handle
 
-        cuda.memcpy_htod_async(self.d_input, inp, self.stream)
 
-        ok = self.context.execute_async_v2(
-            bindings=self.bindings,
-            stream_handle=self.stream.handle
-        )
+    def wait(self, handle):
+        """
+        Block until the frame behind handle is done; returns its output.
+        The buffer is reused by the submit() after next.
+        """
 
-        if not ok:
-            raise RuntimeError("TensorRT execution failed")
+        slot = self.slots[handle]
+        slot.stream.synchronize()
+
+        return slot.output_host
 
-        cuda.memcpy_dtoh_async(self.output_host, self.d_output, self.stream)
-        self.stream.synchronize()
 
-        return self.output_host
+    def infer(self, frame):
+
+        return self.wait(self.submit(frame))
 
 
 # ------------------------------------------------------------
 # Image Preprocessing
 # ------------------------------------------------------------
 
-def preprocess_image(path):
+class CameraFrameReader:
+    """
+    Reads the camera JPEG, returning None when it has not changed since
+    the previous read. camera_writer.sh re-publishes its newest capture
+    every 20 ms (new inode + mtime even for the same frame), so a stat
+    signature match skips the read and a byte compare skips repeats.
+    """
+
+    def __init__(self, path):
+
+        self.path = path
+        self.signature = None
+        self.last = None
+
+    def read(self):
+
+        # Raises FileNotFoundError itself; no exists() + open() race
+        st = os.stat(self.path)
+        signature = (st.st_ino, st.st_mtime_ns, st.st_size)
+        if signature == self.signature:
+            return None
+
+        with open(self.path, "rb") as f:
+            data = f.read()
+
+        self.signature = signature
+        if data == self.last:
+            return None
+
+        self.last = data
+        return data
+
+
+def preprocess_image(jpeg, size):
+    """
+    Decode a JPEG frame to a uint8 HWC RGB array. Frames at least twice
+    the model size are downscaled inside libjpeg (DCT scaling via draft),
+    otherwise the native size is kept. Final resize + normalization
+    happen in TRTInference.submit (fused on the GPU when available).
+    """
+
+    img = Image.open(io.BytesIO(jpeg))
+    img.draft("RGB", size)
+    img = img.convert("RGB")
+
+    return np.asarray(img, dtype=np.uint8)
 
-    if not os.path.exists(path):
-        raise FileNotFoundError(f"Frame not found: {path}")
 
-    img = Image.open(path).convert("RGB")
-    img = img.resize((MODEL_W, MODEL_H))
+def resize_frame(frame, width, height):
+    """
+    CPU fallback resize; no-op when the frame already has the model size.
+    """
 
-    arr = np.array(img, dtype=np.float32) / 255.0
-    arr = np.transpose(arr, (2, 0, 1))
-    arr = np.expand_dims(arr, axis=0)
+    if frame.shape[:2] == (height, width):
+        return frame
 
-    return np.ascontiguousarray(arr, dtype=np.float32)
+    img = Image.fromarray(frame).resize((width, height), Image.BILINEAR)
+
+    return np.asarray(img, dtype=np.uint8)
+
+
+_INV_255 = np.float32(1.0 / 255.0)
+
+
+def normalize_chw(frame, out):
+    """
+    CPU fallback: uint8 HWC -> (1, 3, H, W) in [0, 1], written into out.
+    One strided read per channel straight into the contiguous plane; no
+    float HWC temporary and no transpose copy.
+    """
+
+    for c in range(3):
+        np.multiply(frame[:, :, c], _INV_255, out=out[0, c])
+
+    return out
 
 
 # ------------------------------------------------------------
 # Detection Decode (Basic Confidence Filter)
 # ------------------------------------------------------------
 
-def decode_output(output):
+def _filter_detections_np(out, threshold):
 
-    detections = []
+    # Widen FP16 output only for the surviving rows
+    rows = out[out[:, 4] >= threshold].astype(np.float32, copy=False)
 
-    out = output[0]  # (25200, 6)
+    return rows[:, 4], rows[:, 0:4], rows[:, 5].astype(np.int32)
 
-    for row in out:
-        conf = float(row[4])
 
-        if conf < CONF_THRESHOLD:
-            continue
+if njit is not None:
+
+    @njit(cache=True)
+    def _filter_detections_jit(out, threshold):
+
+        n = 0
+        for i in range(out.shape[0]):
+            if out[i, 4] >= threshold:
+                n += 1
+
+        confs = np.empty(n, dtype=np.float32)
+        xywhs = np.empty((n, 4), dtype=np.float32)
+        ids = np.empty(n, dtype=np.int32)
 
-        x, y, w, h = row[0:4]
-        class_id = int(row[5])
+        j = 0
+        for i in range(out.shape[0]):
+            if out[i, 4] >= threshold:
+                confs[j] = out[i, 4]
+                for k in range(4):
+                    xywhs[j, k] = out[i, k]
+                ids[j] = np.int32(out[i, 5])
+                j += 1
 
-        detections.append({
+        return confs, xywhs, ids
+
+else:
+    _filter_detections_jit = None
+
+
+def filter_detections(out, threshold):
+    """
+    Confidence filter over the (N, 6) output. Returns (confs, xywhs, ids)
+    arrays for surviving rows. Uses the Numba loop (no NumPy temporaries)
+    when available; Numba has no float16, so FP16 output uses NumPy.
+    """
+
+    if _filter_detections_jit is not None and out.dtype == np.float32:
+        return _filter_detections_jit(out, np.float32(threshold))
+
+    return _filter_detections_np(out, threshold)
+
+
+def warm_up_filter():
+    """
+    Compile (or load the cached) Numba filter before the first frame. A
+    numba that imports but cannot compile (llvmlite mismatch) falls back
+    to the NumPy mask instead of stopping the app.
+    """
+    global _filter_detections_jit
+
+    if _filter_detections_jit is None:
+        return
+
+    try:
+        _filter_detections_jit(np.zeros((1, 6), dtype=np.float32), np.float32(CONF_THRESHOLD))
+    except Exception as e:
+        print("Numba detection filter unavailable, using NumPy:", e)
+        _filter_detections_jit = None
+
+
+def decode_output(output):
+
+    out = output.reshape(-1, 6)  # (25200, 6)
+
+    # Only surviving rows reach Python
+    confs, xywhs, ids = filter_detections(out, CONF_THRESHOLD)
+
+    # One bulk .tolist() per array instead of a float() per value
+    return [
+        {
             "class_id": class_id,
             "confidence": conf,
-            "bbox_xywh": [
-                float(x),
-                float(y),
-                float(w),
-                float(h)
-            ]
-        })
+            "bbox_xywh": bbox
+        }
+        for class_id, conf, bbox in zip(ids.tolist(), confs.tolist(), xywhs.tolist())
+    ]
+
+
+# ------------------------------------------------------------
+# Scheduling
+# ------------------------------------------------------------
 
-    return detections
+def apply_scheduling():
+    """
+    Apply scheduling.cpu_affinity / realtime_priority to this thread.
+    Called before the stage threads start, which inherit both. Failures
+    (e.g. SCHED_FIFO without CAP_SYS_NICE) are reported, not fatal.
+    """
+
+    if CPU_AFFINITY:
+        try:
+            os.sched_setaffinity(0, {int(c) for c in CPU_AFFINITY})
+            print("CPU affinity:", sorted(os.sched_getaffinity(0)))
+        except (AttributeError, OSError, ValueError) as e:
+            print("CPU affinity not applied:", e)
+
+    if RT_PRIORITY > 0:
+        try:
+            os.sched_setscheduler(0, os.SCHED_FIFO, os.sched_param(RT_PRIORITY))
+            print("Scheduler: SCHED_FIFO priority", RT_PRIORITY)
+        except (AttributeError, OSError) as e:
+            print("SCHED_FIFO not applied:", e)
+
+
+# ------------------------------------------------------------
+# Camera Frame Events
+# ------------------------------------------------------------
+
+def open_frame_watch():
+    """
+    Watch the camera frame directory; camera_writer.sh publishes with
+    mv, which fires IN_MOVED_TO. None when inotify is unavailable.
+    """
+    if INotify is None:
+        return None
+    try:
+        inotify = INotify()
+        inotify.add_watch(os.path.dirname(SHARED_FRAME_PATH), inotify_flags.MOVED_TO)
+        return inotify
+    except Exception:
+        return None
+
+
+def wait_for_frame(inotify, timeout_s):
+    """
+    Block until the camera frame is re-published or timeout_s elapses.
+    Falls back to a plain sleep when inotify is unavailable.
+    """
+    if inotify is None:
+        time.sleep(timeout_s)
+        return
+
+    frame_name = os.path.basename(SHARED_FRAME_PATH)
+    deadline = time.perf_counter() + timeout_s
+    while True:
+        remaining_ms = int((deadline - time.perf_counter()) * 1000)
+        if remaining_ms <= 0:
+            return
+        try:
+            events = inotify.read(timeout=remaining_ms)
+        except Exception:
+            time.sleep(max(0.0, deadline - time.perf_counter()))
+            return
+        if any(ev.name == frame_name for ev in events):
+            return
+
+
+# ------------------------------------------------------------
+# System Stats
+# ------------------------------------------------------------
+
+SYSTEM_STATS_INTERVAL_S = 0.5
+
+_system_stats = ("N/A", "N/A")
+_system_stats_ts = None
+
+
+def system_stats(now):
+    """
+    (cpu_percent, memory_percent), refreshed at most every
+    SYSTEM_STATS_INTERVAL_S; virtual_memory() parses /proc/meminfo.
+    """
+    global _system_stats, _system_stats_ts
+
+    if psutil is None:
+        return _system_stats
+
+    if _system_stats_ts is None or now - _system_stats_ts >= SYSTEM_STATS_INTERVAL_S:
+        _system_stats = (psutil.cpu_percent(), psutil.virtual_memory().percent)
+        _system_stats_ts = now
+
+    return _system_stats
+
+
+# EMA weight of the newest frame-to-frame interval in the reported fps
+FPS_EMA_ALPHA = 0.2
+
+_fps_ema = 0.0
+_fps_last_ts = None
+
+
+def throughput_fps(now):
+    """
+    Finished frames per second: EMA of 1 / gap between successive
+    results. Unlike per-frame latency it does not fall when frames queue
+    up behind each other in the pipeline.
+    """
+    global _fps_ema, _fps_last_ts
+
+    if _fps_last_ts is not None:
+        fps = 1.0 / max(now - _fps_last_ts, 1e-9)
+        _fps_ema = fps if _fps_ema == 0.0 else _fps_ema + FPS_EMA_ALPHA * (fps - _fps_ema)
+    _fps_last_ts = now
+
+    return _fps_ema
 
 
 # ------------------------------------------------------------
 # Main Loop
 # ------------------------------------------------------------
 
-def main():
+def finish_result(trt_engine, job):
+    """
+    Wait for a submitted frame and decode it. Returns (jpeg, payload) for
+    the publisher; jpeg is None when the frame failed.
+    """
 
-    print("ADRIS Inference Started")
-    print("Engine:", ENGINE_PATH)
-    print("Target FPS:", TARGET_FPS)
+    handle, jpeg, timestamp, t0 = job
+
+    try:
+
+        output = trt_engine.wait(handle)
+        t1 = time.perf_counter()
+
+        latency_ms = (t1 - t0) * 1000.0
+        detections = decode_output(output)
+
+        cpu, mem = system_stats(t1)
+
+        payload = {
+            "timestamp": timestamp,
+            "detections": detections,
+            "latency_ms": float(latency_ms),
+            "fps": float(throughput_fps(t1)),
+            "system": {
+                "cpu_percent": cpu,
+                "memory_percent": mem
+            }
+        }
+
+    except Exception as e:
+
+        return None, error_payload(timestamp, e)
+
+    return jpeg, payload
 
-    trt_engine = TRTInference(ENGINE_PATH)
+
+def error_payload(timestamp, error):
+
+    return {
+        "timestamp": timestamp,
+        "detections": [],
+        "latency_ms": "N/A",
+        "fps": "N/A",
+        "system": {},
+        "error": str(error)
+    }
+
+
+def put_until_stopped(q, item):
+    """
+    Blocking put that still notices shutdown. Returns False if stopped.
+    """
+
+    while not _STOP:
+        try:
+            q.put(item, timeout=0.1)
+            return True
+        except queue.Full:
+            continue
+
+    return False
+
+
+def capture_frames(camera, frame_watch, model_size, frames):
+    """
+    Stage 1 (thread): wait for a new camera frame, decode it and queue
+    (jpeg, frame, timestamp). Paced at TARGET_FPS; blocks
+    while inference is FRAME_QUEUE_SIZE frames behind. A failure is queued
+    as (None, exception, ...) so it is published in order.
+    """
 
     frame_interval = 1.0 / TARGET_FPS
 
     while not _STOP:
 
-        loop_start = time.time()
-        timestamp = datetime.now().astimezone().isoformat()
+        loop_start = time.perf_counter()
+        timestamp = datetime.now(_TZ).isoformat()
 
         try:
 
-            inp = preprocess_image(SHARED_FRAME_PATH)
+            # None: no new camera frame since the last one was queued
+            jpeg = camera.read()
+            if jpeg is None:
+                wait_for_frame(frame_watch, frame_interval)
+                continue
+
+            item = (jpeg, preprocess_image(jpeg, model_size), timestamp)
 
-            t0 = time.time()
-            output = trt_engine.infer(inp)
-            t1 = time.time()
+        except Exception as e:
 
-            latency_ms = (t1 - t0) * 1000.0
-            detections = decode_output(output)
+            item = (None, e, timestamp)
 
-            cpu = psutil.cpu_percent() if psutil else "N/A"
-            mem = psutil.virtual_memory().percent if psutil else "N/A"
+        if not put_until_stopped(frames, item):
+            return
 
-            payload = {
-                "timestamp": timestamp,
-                "detections": detections,
-                "latency_ms": float(latency_ms),
-                "fps": float(1.0 / max(time.time() - loop_start, 1e-9)),
-                "system": {
-                    "cpu_percent": cpu,
-                    "memory_percent": mem
-                }
-            }
+        elapsed = time.perf_counter() - loop_start
+        time.sleep(max(0, frame_interval - elapsed))
+
+
+def publish_results(frame_slot, results):
+    """
+    Stage 3 (thread): frame slot + JSON writes, off the inference thread.
+    Runs until it receives None.
+    """
+
+    while True:
+
+        item = results.get()
+        if item is None:
+            return
 
+        jpeg, payload = item
+
+        try:
+            # Frame first: the dashboard wakes on the JSON publish
+            if jpeg is not None:
+                frame_slot.write(jpeg)
+            publish_payload(payload)
         except Exception as e:
+            print("Publish failed:", e)
 
-            payload = {
-                "timestamp": timestamp,
-                "detections": [],
-                "latency_ms": "N/A",
-                "fps": "N/A",
-                "system": {},
-                "error": str(e)
-            }
 
-        write_json_atomic(payload, SHARED_JSON_PATH)
+_PRECISION_NAMES = {
+    np.dtype(np.float32): "fp32",
+    np.dtype(np.float16): "fp16",
+    np.dtype(np.int8): "int8",
+}
+
+
+def report_precision(io_dtype):
+    """
+    TensorRT exposes the I/O binding dtypes, not the precision the layers
+    were built with, so mode.precision cannot be confirmed from the
+    engine. A configured value is checked against the bindings and a
+    mismatch is reported rather than printed as fact.
+    """
+
+    io = _PRECISION_NAMES.get(np.dtype(io_dtype), np.dtype(io_dtype).name)
 
-        elapsed = time.time() - loop_start
-        sleep_time = max(0, frame_interval - elapsed)
-        time.sleep(sleep_time)
+    if PRECISION == "auto":
+        print("Precision (I/O bindings):", io)
+        return
+
+    print("Precision:", PRECISION, "(mode.precision), I/O bindings:", io)
+
+    if PRECISION != io:
+        note = " (expected if only the layers, not the I/O, were built reduced-precision)" if io == "fp32" else ""
+        print(f"WARNING: mode.precision={PRECISION} does not match the engine's {io} I/O bindings{note}")
+
+
+def main():
+
+    print("ADRIS Inference Started")
+    print("Engine:", ENGINE_PATH)
+    print("Target FPS:", TARGET_FPS)
+
+    apply_scheduling()
+
+    trt_engine = TRTInference(ENGINE_PATH)
+    report_precision(trt_engine.input_dtype)
+    camera = CameraFrameReader(SHARED_FRAME_PATH)
+    frame_watch = open_frame_watch()
+    frame_slot = SharedFrameSlot(SHARED_FRAME_SLOT_PATH, FRAME_SLOT_CAPACITY)
+
+    warm_up_filter()
+
+    # Three stages: capture (thread) -> inference (this thread, which owns
+    # the CUDA context) -> publish (thread). Bounded queues give
+    # backpressure so frames never pile up behind a slow stage.
+    frames = queue.Queue(maxsize=FRAME_QUEUE_SIZE)
+    results = queue.Queue(maxsize=FRAME_QUEUE_SIZE)
+
+    capture = threading.Thread(
+        target=capture_frames,
+        args=(camera, frame_watch, (trt_engine.model_w, trt_engine.model_h), frames),
+        name="capture",
+        daemon=True
+    )
+    publisher = threading.Thread(
+        target=publish_results,
+        args=(frame_slot, results),
+        name="publish"
+    )
+    capture.start()
+    publisher.start()
+
+    # While inference keeps up each frame is finished right after submit.
+    # When the next frame is already queued, frame N is left in flight and
+    # finished after frame N+1 is submitted, overlapping GPU work for N+1
+    # with decode for N.
+    pending = None
+
+    try:
+
+        while not _STOP:
+
+            try:
+                jpeg, frame, timestamp = frames.get(timeout=0.1)
+            except queue.Empty:
+                if pending is not None:
+                    results.put(finish_result(trt_engine, pending))
+                    pending = None
+                continue
+
+            job = None
+            error = frame if jpeg is None else None
+
+            if error is None:
+                try:
+                    t0 = time.perf_counter()
+                    job = (trt_engine.submit(frame), jpeg, timestamp, t0)
+                except Exception as e:
+                    error = e
+
+            if pending is not None:
+                results.put(finish_result(trt_engine, pending))
+                pending = None
+
+            if error is not None:
+                results.put((None, error_payload(timestamp, error)))
+            elif frames.empty():
+                results.put(finish_result(trt_engine, job))
+            else:
+                pending = job
+
+        if pending is not None:
+            results.put(finish_result(trt_engine, pending))
+
+    finally:
+        # Unblocks the publisher even if the inference loop raised
+        results.put(None)
+        publisher.join()
+        capture.join(timeout=1.0)
 
     print("ADRIS stopped cleanly.")
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
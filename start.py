@@ -12,6 +12,7 @@
 # - Each process runs in its own process group
 # - On shutdown we kill the entire group (prevents lingering gst-launch)
 
+import importlib.util
 import json
 import os
 import signal
@@ -21,6 +22,11 @@ import time
 from pathlib import Path
 from typing import Optional
 
+try:
+    from inotify_simple import INotify, flags as inotify_flags
+except Exception:
+    INotify = None
+
 
 # ---------------------------------------------------------------------
 # Configuration Loading
@@ -32,6 +38,7 @@ CONFIG_PATH = PROJECT_ROOT / "config" / "board_config.json"
 with open(CONFIG_PATH, "r", encoding="utf-8") as f:
     CONFIG = json.load(f)
 
+HOST = CONFIG["network"]["host"]
 PORT = CONFIG["network"]["port"]
 SHARED_FRAME_PATH = CONFIG["paths"]["shared_frame"]
 SHARED_JSON_PATH = CONFIG["paths"]["shared_json"]
@@ -103,13 +110,74 @@ def terminate_process_group(proc: Optional[subprocess.Popen], name: str) -> None
                 pass
 
 
+def dashboard_command() -> list:
+    """
+    Serve the dashboard with gunicorn + gevent when installed, so each
+    long-lived MJPEG client costs a greenlet instead of an OS thread.
+    Exactly one worker: the background updater (and CSV log) must run
+    once. Falls back to the Flask server in dashboard_server.py.
+    """
+    if importlib.util.find_spec("gunicorn") and importlib.util.find_spec("gevent"):
+        return [
+            sys.executable, "-m", "gunicorn",
+            "-k", "gevent",
+            "-w", "1",
+            "-b", f"{HOST}:{PORT}",
+            # Below terminate_process_group's 5 s, so the worker exits (and
+            # runs atexit) before it would be SIGKILLed; MJPEG streams never
+            # finish on their own.
+            "--graceful-timeout", "2",
+            "--chdir", str(DASHBOARD_SERVER.parent),
+            "dashboard_server:app",
+        ]
+    return [sys.executable, str(DASHBOARD_SERVER)]
+
+
+def _watch_dir(path: str):
+    """
+    inotify watch on the parent directory of path (None if unavailable).
+    Producers publish by rename, so MOVED_TO covers them; CREATE covers
+    direct writers.
+    """
+    if INotify is None:
+        return None
+    try:
+        inotify = INotify()
+        inotify.add_watch(
+            os.path.dirname(path),
+            inotify_flags.CREATE | inotify_flags.MOVED_TO
+        )
+        return inotify
+    except Exception:
+        return None
+
+
 def wait_for_file(path: str, timeout_s: float, name: str) -> bool:
-    start = time.time()
-    while time.time() - start < timeout_s:
-        if os.path.exists(path):
-            print(f"[OK] {name} ready: {path}")
-            return True
-        time.sleep(0.1)
+    """
+    Block until path exists. Event-driven with inotify, 100 ms polling
+    otherwise. The watch is armed before the first exists() check so a
+    file created in between is not missed.
+    """
+    inotify = _watch_dir(path)
+    deadline = time.monotonic() + timeout_s
+    try:
+        while True:
+            if os.path.exists(path):
+                print(f"[OK] {name} ready: {path}")
+                return True
+            remaining_s = deadline - time.monotonic()
+            if remaining_s <= 0:
+                break
+            if inotify is None:
+                time.sleep(min(0.1, remaining_s))
+                continue
+            try:
+                inotify.read(timeout=int(remaining_s * 1000) + 1)
+            except Exception:
+                time.sleep(min(0.1, remaining_s))
+    finally:
+        if inotify is not None:
+            inotify.close()
     print(f"[WARN] {name} not ready after {timeout_s:.1f}s: {path}")
     return False
 
@@ -147,7 +215,7 @@ def main() -> None:
         if not DASHBOARD_SERVER.exists():
             raise FileNotFoundError(f"Missing {DASHBOARD_SERVER}")
 
-        dashboard_proc = start_process([sys.executable, str(DASHBOARD_SERVER)], "Dashboard Server")
+        dashboard_proc = start_process(dashboard_command(), "Dashboard Server")
         time.sleep(1.0)
 
         # 3) Inference app